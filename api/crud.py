@@ -1,30 +1,29 @@
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from . import models
 from . import schemas
 
 
-def get_items(
+def query_items(
     db: Session, skip: int = 0, limit: int = 100, query: str = "", scan_uuid: str = ""
 ):
-    """Filter items with a query."""
+    """Returns the query used to filter items."""
+    items = db.query(models.Item)
     if query:
-        return (
-            db.query(models.Item)
-            .filter(models.Item.scan_data["payload"]["raw"].astext == query)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        items = items.filter(models.Item.scan_data["payload"]["raw"].astext == query)
     elif scan_uuid:
-        return (
-            db.query(models.Item)
-            .filter(models.Item.scan_data["meta"]["uuid"].astext == scan_uuid)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    return db.query(models.Item).offset(skip).limit(limit).all()
+        items = items.filter(models.Item.scan_data["meta"]["uuid"].astext == scan_uuid)
+    return items.offset(skip).limit(limit)
+
+
+def get_items(
+    db: Session, skip: int = 0, limit: int = 100, query: str = "", scan_uuid: str = ""
+):
+    """Filter items with a query."""
+    return query_items(
+        db, skip=skip, limit=limit, query=query, scan_uuid=scan_uuid
+    ).all()
 
 
 def get_item(db: Session, item_id: int):
@@ -43,13 +42,18 @@ def create_item(db: Session, item: schemas.ItemCreate):
 
 def create_tst(db: Session, data: schemas.TimeStampTokenCreate):
     """Create a TimeStampToken."""
-    db_tst = models.TimeStampToken(**data)
+    db_tst = models.TimeStampToken(**data.model_dump())
     db.add(db_tst)
     db.commit()
     db.refresh(db_tst)
     return db_tst
 
 
+def query_tsts(db: Session, skip: int = 0, limit: int = 100):
+    """Returns the query used to list TimeStampTokens."""
+    return db.query(models.TimeStampToken).offset(skip).limit(limit)
+
+
 def get_tst(db: Session, skip: int = 0, limit: int = 100, scan_uuid=""):
     """Returns a list of TimeStampToken or filter TimeStampToken with the
     UUID of a scan."""
@@ -59,11 +63,32 @@ def get_tst(db: Session, skip: int = 0, limit: int = 100, scan_uuid=""):
             .filter(models.TimeStampToken.scan_uuid == scan_uuid)
             .first()
         )
-    return db.query(models.TimeStampToken).offset(skip).limit(limit).all()
+    return query_tsts(db, skip=skip, limit=limit).all()
 
 
 def db_stats(db: Session):
+    """Returns the number of scans and of TimeStampTokens.
+
+    With PostgreSQL the values are estimations read from the statistics
+    collector (n_live_tup, refreshed by autovacuum and ANALYZE) instead of
+    counting the rows of the tables."""
+    if db.get_bind().dialect.name != "postgresql":
+        return {
+            "scans": db.query(models.Item).count(),
+            "tst": db.query(models.TimeStampToken).count(),
+        }
+    rows = db.execute(
+        text(
+            "SELECT relname, n_live_tup FROM pg_stat_user_tables "
+            "WHERE relname IN (:items, :tsts)"
+        ),
+        {
+            "items": models.Item.__tablename__,
+            "tsts": models.TimeStampToken.__tablename__,
+        },
+    )
+    estimations = dict(rows.tuples())
     return {
-        "scans": db.query(models.Item).count(),
-        "tst": db.query(models.TimeStampToken).count(),
+        "scans": estimations.get(models.Item.__tablename__, 0),
+        "tst": estimations.get(models.TimeStampToken.__tablename__, 0),
     }
@@ -18,7 +18,14 @@ SQLALCHEMY_DATABASE_URI = "postgresql://{user}:{password}@{host}:{port}/{name}".
     name=DATABASE_NAME, **DB_CONFIG_DICT
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
+# Connections are checked out from a pool shared by the requests of a worker.
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URI,
+    pool_size=getattr(config, "DB_POOL_SIZE", 25),
+    max_overflow=getattr(config, "DB_MAX_OVERFLOW", 25),
+    pool_recycle=getattr(config, "DB_POOL_RECYCLE", 1800),
+    pool_pre_ping=True,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
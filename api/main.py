@@ -1,9 +1,13 @@
+import base64
+import os
 import sys
-from ast import literal_eval
+from functools import lru_cache
 from typing import Any
+from typing import Callable
 from typing import Dict
-from typing import List
+from typing import Iterator
 
+import orjson
 import rfc3161ng
 from fastapi import Depends
 from fastapi import FastAPI
@@ -11,10 +15,17 @@ from fastapi import HTTPException
 from fastapi import Request
 from fastapi import Response
 from fastapi import status
+from fastapi.openapi.docs import get_redoc_html
+from fastapi.openapi.docs import get_swagger_ui_html
+from fastapi.openapi.docs import get_swagger_ui_oauth2_redirect_html
 from fastapi.openapi.utils import get_openapi
+from fastapi.responses import HTMLResponse
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic
 from fastapi.security import HTTPBasicCredentials
 from fastapi_websocket_pubsub import PubSubEndpoint
+from pyasn1.codec.der import decoder
 from sqlalchemy.orm import Session
 
 from . import crud
@@ -29,10 +40,43 @@ try:
 except Exception:
     from instance import example as config
 
+
+@lru_cache(maxsize=None)
+def get_certificate() -> bytes:
+    """Returns the certificate of the TSA, read only once, on first use.
+    rfc3161ng does not accept a parsed certificate, so it is still parsed by
+    each check."""
+    with open(config.CERTIFICATE_FILE, "rb") as certificate_file:
+        return certificate_file.read()
+
+
+def check_timestamp(tst: bytes, data: bytes) -> bool:
+    """Checks a TimeStampToken with the hash algorithm of its message imprint,
+    since the oldest tokens were created with SHA-1 and the new ones with SHA-256."""
+    token, substrate = decoder.decode(tst, asn1Spec=rfc3161ng.TimeStampToken())
+    if substrate:
+        raise ValueError("extra data after tst")
+    hashname = rfc3161ng.api.get_hash_from_oid(
+        token.tst_info.message_imprint.hash_algorithm[0]
+    )
+    return rfc3161ng.check_timestamp(
+        token,
+        certificate=get_certificate(),
+        data=data,
+        hashname=hashname,
+    )
+
+
 security = HTTPBasic()
 
 # app = FastAPI(dependencies=[Depends(security)])
-app = FastAPI()
+# The OpenAPI schema and the documentation are served by the routes defined below.
+app = FastAPI(
+    default_response_class=ORJSONResponse,
+    openapi_url=None,
+    docs_url=None,
+    redoc_url=None,
+)
 
 http_security = Depends(security)
 
@@ -61,9 +105,11 @@ pubsub_endpoint.register_route(app, path="/pubsub")
 
 class RawResponse(Response):
     media_type = "binary/octet-stream"
+    # Translation table XOR-ing each byte with 0x54.
+    xor_table = bytes(b ^ 0x54 for b in range(256))
 
     def render(self, content: bytes) -> bytes:
-        return bytes([b ^ 0x54 for b in content])
+        return content.translate(self.xor_table)
 
 
 def custom_openapi() -> Dict[str, Any]:
@@ -85,6 +131,7 @@ def custom_openapi() -> Dict[str, Any]:
             "url": "https://www.gnu.org/licenses/agpl-3.0.en.html",
         },
         routes=app.routes,
+        servers=app.servers,
     )
     openapi_schema["info"]["x-logo"] = {
         "url": "https://www.circl.lu/assets/images/circl-logo.png"
@@ -95,7 +142,54 @@ def custom_openapi() -> Dict[str, Any]:
 
 app.openapi = custom_openapi
 
-models.Base.metadata.create_all(bind=engine)
+
+def openapi_json() -> bytes:
+    """Returns the OpenAPI schema, serialized to JSON only once."""
+    if not hasattr(app.state, "openapi_json"):
+        app.state.openapi_json = orjson.dumps(app.openapi())
+    return app.state.openapi_json
+
+
+# The routes below behave like the default ones of FastAPI, including behind a
+# proxy (root_path), but serve the cached schema.
+@app.get("/openapi.json", include_in_schema=False)
+async def openapi(request: Request) -> Response:
+    root_path = request.scope.get("root_path", "").rstrip("/")
+    server_urls = {server.get("url") for server in app.servers}
+    if root_path and app.root_path_in_servers and root_path not in server_urls:
+        app.servers.insert(0, {"url": root_path})
+    return Response(content=openapi_json(), media_type="application/json")
+
+
+@app.get("/docs", include_in_schema=False)
+async def swagger_ui_html(request: Request) -> HTMLResponse:
+    root_path = request.scope.get("root_path", "").rstrip("/")
+    return get_swagger_ui_html(
+        openapi_url=root_path + "/openapi.json",
+        title=f"{app.title} - Swagger UI",
+        oauth2_redirect_url=root_path + app.swagger_ui_oauth2_redirect_url,
+        init_oauth=app.swagger_ui_init_oauth,
+        swagger_ui_parameters=app.swagger_ui_parameters,
+    )
+
+
+@app.get(app.swagger_ui_oauth2_redirect_url, include_in_schema=False)
+async def swagger_ui_redirect() -> HTMLResponse:
+    return get_swagger_ui_oauth2_redirect_html()
+
+
+@app.get("/redoc", include_in_schema=False)
+async def redoc_html(request: Request) -> HTMLResponse:
+    root_path = request.scope.get("root_path", "").rstrip("/")
+    return get_redoc_html(
+        openapi_url=root_path + "/openapi.json", title=f"{app.title} - ReDoc"
+    )
+
+
+# The tables are created with the init-db command of scandale_cli.py.
+# For development, SCANDALE_AUTOCREATE=1 creates them when the application starts.
+if os.environ.get("SCANDALE_AUTOCREATE", "").lower() in ("1", "true", "yes"):
+    models.Base.metadata.create_all(bind=engine)
 
 
 # Dependency
@@ -111,6 +205,35 @@ db_session: Session = Depends(get_db)
 auth_verification = Depends(verification)
 
 
+def stream_json_array(
+    query: Callable[[Session], Any], to_dict: Callable[[Any], Dict[str, Any]]
+) -> StreamingResponse:
+    """Returns a response streaming the rows of a query as a JSON array.
+    The query is executed and its first batch of rows fetched before the
+    response is started, so that database errors still result in an error
+    status. A dedicated session is used since the session of the request is
+    closed before the body of the response is sent."""
+    db = SessionLocal()
+    try:
+        rows = iter(query(db).yield_per(256))
+        first = next(rows, None)
+        head = b"[" if first is None else b"[" + orjson.dumps(to_dict(first))
+    except Exception:
+        db.close()
+        raise
+
+    def content() -> Iterator[bytes]:
+        try:
+            yield head
+            for row in rows:
+                yield b"," + orjson.dumps(to_dict(row))
+            yield b"]"
+        finally:
+            db.close()
+
+    return StreamingResponse(content(), media_type="application/json")
+
+
 #
 # Item
 #
@@ -121,10 +244,11 @@ def read_items(
     skip: int = 0,
     limit: int = 100,
     q: str = "",
-    db: Session = db_session,
-) -> List[schemas.ItemBase]:
-    items = crud.get_items(db, skip=skip, limit=limit, query=q)
-    return items
+) -> StreamingResponse:
+    return stream_json_array(
+        lambda db: crud.query_items(db, skip=skip, limit=limit, query=q),
+        lambda item: schemas.ItemBase.model_validate(item).model_dump(mode="json"),
+    )
 
 
 @app.get("/items/{item_id}", response_model=schemas.ItemBase)
@@ -152,41 +276,42 @@ async def create_item(
 #
 
 
+def tst_to_dict(db_tst: models.TimeStampToken) -> Dict[str, str]:
+    """Returns a JSON serializable representation of a TimeStampToken.
+    The token is base64 encoded."""
+    return {
+        "tst": base64.b64encode(db_tst.tst).decode("utf-8"),
+        "scan_uuid": str(db_tst.scan_uuid),
+    }
+
+
 @app.post("/TimeStampTokens/")
 async def create_tst(
-    request: Request, db: Session = db_session, Verifcation=auth_verification
+    data: schemas.TimeStampTokenCreate,
+    db: Session = db_session,
+    Verifcation=auth_verification,
 ):
     """Insert a TimeStampToken and publish it through the WebSocket."""
-    data: bytes = await request.body()
-    dict_data = literal_eval(data.decode("utf-8"))
-    new_tst = crud.create_tst(db=db, data=dict_data)
-    dict_tst = {
-        "tst": new_tst.tst,
-        "scan_uuid": new_tst.scan_uuid,
-    }
-    dict_tst = str(dict_tst)
+    new_tst = crud.create_tst(db=db, data=data)
+    dict_tst = tst_to_dict(new_tst)
     await pubsub_endpoint.publish(["tst"], data=dict_tst)
     return dict_tst
 
 
 @app.get("/TimeStampTokens/")
-def read_tsts(skip: int = 0, limit: int = 100, db: Session = db_session):
-    tsts = crud.get_tst(db, skip=skip, limit=limit)
-    return str([{"tst": elem.tst, "scan_uuid": elem.scan_uuid} for elem in tsts])
+def read_tsts(skip: int = 0, limit: int = 100) -> StreamingResponse:
+    return stream_json_array(
+        lambda db: crud.query_tsts(db, skip=skip, limit=limit), tst_to_dict
+    )
 
 
-@app.get("/TimeStampTokens/{scan_uuid}", response_model=bytes)
+@app.get("/TimeStampTokens/{scan_uuid}")
 def get_tst(scan_uuid="", db: Session = db_session):
     """Returns a TimeStampToken object corresponding to the scan UUID given as parameter."""
     db_tst = crud.get_tst(db, scan_uuid=scan_uuid)
     if db_tst is None:
         raise HTTPException(status_code=404, detail="TimeStampToken not found")
-    return str(
-        {
-            "tst": db_tst.tst,
-            "scan_uuid": db_tst.scan_uuid,
-        }
-    )
+    return tst_to_dict(db_tst)
 
 
 @app.get("/TimeStampTokens/token/{scan_uuid}", response_model=bytes)
@@ -208,9 +333,7 @@ def check_tst(scan_uuid="", db: Session = db_session):
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    certificate = open(config.CERTIFICATE_FILE, "rb").read()
-    rt = rfc3161ng.RemoteTimestamper(config.REMOTE_TIMESTAMPER, certificate=certificate)
-    result = rt.check(
+    result = check_timestamp(
         db_tst.tst, data=db_item[0].scan_data["payload"]["raw"].encode("utf-8")
     )
     return {"validity": result}
@@ -236,9 +359,8 @@ async def stats(db: Session = db_session):
     return {"dbsize": crud.db_stats(db=db)}
 
 
-@app.get("/system/info/")
-def system_info():
-    """Provides information about the instance."""
+def get_system_info() -> Dict[str, str]:
+    """Returns information about the instance."""
     version = __version__.split("-")
     if len(version) == 1:
         software_version = version[0]
@@ -253,3 +375,13 @@ def system_info():
         "version": software_version,
         "version_url": version_url,
     }
+
+
+# This information does not change during the life of the process.
+SYSTEM_INFO = orjson.dumps(get_system_info())
+
+
+@app.get("/system/info/")
+async def system_info():
+    """Provides information about the instance."""
+    return Response(content=SYSTEM_INFO, media_type="application/json")
@@ -1,6 +1,7 @@
 import uuid
 
 from sqlalchemy import Column
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import LargeBinary
 from sqlalchemy.dialects.postgresql import JSONB
@@ -16,6 +17,10 @@ class Item(Base):
     scan_data = Column(JSONB, default={})
 
 
+# Items are looked up by the UUID of their scan (see crud.get_items).
+Index("ix_items_scan_uuid", Item.scan_data["meta"]["uuid"].astext)
+
+
 class TimeStampToken(Base):
     __tablename__ = "time_stamp_tokens"
 
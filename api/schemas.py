@@ -1,6 +1,10 @@
+import base64
 import uuid
+from typing import Any
 
 from pydantic import BaseModel
+from pydantic import Field
+from pydantic import field_validator
 
 
 class Payload(BaseModel):
@@ -49,4 +53,20 @@ class TimeStampToken(BaseModel):
 
 
 class TimeStampTokenCreate(TimeStampToken):
-    pass
+    tst: bytes = Field(
+        description="Base64 encoded TimeStampToken.",
+        json_schema_extra={"format": "base64"},
+    )
+
+    @field_validator("tst", mode="before")
+    @classmethod
+    def decode_tst(cls, value: Any) -> bytes:
+        """Decodes the token, which is base64 encoded in the JSON body of the
+        request. Invalid or empty tokens are rejected."""
+        try:
+            tst = base64.b64decode(value, validate=True)
+        except (TypeError, ValueError) as e:
+            raise ValueError("tst must be a base64 encoded string") from e
+        if not tst:
+            raise ValueError("tst must not be empty")
+        return tst
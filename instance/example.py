@@ -7,6 +7,9 @@ DB_PASSWORD = "<password>"
 DB_HOST = "localhost"
 DB_PORT = 5432
 DB_NAME = "scandale"
+DB_POOL_SIZE = 25
+DB_MAX_OVERFLOW = 25
+DB_POOL_RECYCLE = 1800
 
 AUTHENTICATION_REQUIRED = True
 USERS = {
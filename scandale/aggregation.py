@@ -1,117 +1,175 @@
 import asyncio
-import json
+import base64
+import hashlib
+import logging
+import signal
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-import rfc3161ng
 import spade
 from pydantic import ValidationError
 from spade.agent import Agent
 from spade.behaviour import CyclicBehaviour
 
 from api.schemas import ScanDataCreate
+from scandale.utils import SessionRemoteTimestamper
+from scandale.utils import setup_logging
 
 try:
     from instance import config
 except Exception:
     from instance import example as config
 
+logger = logging.getLogger(__name__)
 
 CERTIFICATE = open(config.CERTIFICATE_FILE, "rb").read()
-RT = rfc3161ng.RemoteTimestamper(config.REMOTE_TIMESTAMPER, certificate=CERTIFICATE)
+
+# Each thread of the executor has its own HTTP session (requests does not
+# guarantee that a Session is thread-safe), which keeps the connections to the
+# TSA and to the API alive.
+thread_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Returns the HTTP session of the current thread."""
+    if not hasattr(thread_local, "session"):
+        thread_local.session = requests.Session()
+    return thread_local.session
+
+
+def get_timestamper() -> SessionRemoteTimestamper:
+    """Returns the RemoteTimestamper of the current thread."""
+    if not hasattr(thread_local, "timestamper"):
+        thread_local.timestamper = SessionRemoteTimestamper(
+            config.REMOTE_TIMESTAMPER,
+            session=get_session(),
+            certificate=CERTIFICATE,
+            hashname="sha256",
+        )
+    return thread_local.timestamper
+
+
+# Maximum number of messages processed concurrently by the collecting behaviour.
+BATCH_SIZE = 16
+EXECUTOR = ThreadPoolExecutor(max_workers=8)
 
 
 class AggregationEngine(Agent):
     class CollectingBehav(CyclicBehaviour):
         async def on_start(self):
-            print("Starting behaviour...")
+            logger.info("Starting behaviour...")
 
             self.headers_json = {
                 "Content-Type": "application/json",
                 "accept": "application/json",
             }
-            self.headers_octet_stream = {
-                "Content-Type": "application/octet-stream",
-                "accept": "application/json",
-            }
 
         async def run(self):
             msg = await self.receive(timeout=10)  # Wait for a message for 10 seconds
-            if msg:
-                print(f"Message received with content: {msg.body}")
-                try:
-                    # Convert the JSON string to a JSON object
-                    dict_msg = json.loads(msg.body)
-                    # Validate the format with Pydantic
-                    ScanDataCreate(**dict_msg)
-                except json.decoder.JSONDecodeError:
-                    return
-                except ValidationError:
-                    return
-                # TimeStampToken (TST, see RFC 3161)
-                tst = RT.timestamp(data=dict_msg["payload"]["raw"])
-                dict_tst = str(
-                    {
-                        "tst": tst,
-                        "scan_uuid": dict_msg["meta"]["uuid"],
-                    }
-                )
-
+            if not msg:
+                logger.info("Did not received any message after 10 seconds")
+                return
+            # Collect the messages already waiting in order to process them concurrently
+            messages = [msg]
+            while len(messages) < BATCH_SIZE:
+                msg = await self.receive()
+                if msg is None:
+                    break
+                messages.append(msg)
+
+            scans = []
+            for msg in messages:
+                logger.debug("Message received with content: %s", msg.body)
                 try:
-                    r = requests.post(
-                        urllib.parse.urljoin(config.API_URL, "items/"),
-                        json=dict_msg,
-                        headers=self.headers_json,
-                        auth=("admin", config.USERS["admin"]["password"]),
-                    )
-                    if r.status_code not in (200, 201):
-                        print(
-                            f"Error when sending POST request to the FastAPI server: {r.reason}"
-                        )
-                except requests.exceptions.ConnectionError as e:
-                    print(
-                        f"Error when sending POST request to the FastAPI server:\n{e}"
+                    # Parse and validate the JSON string with Pydantic
+                    scans.append(ScanDataCreate.model_validate_json(msg.body))
+                except ValidationError as e:
+                    logger.warning("Invalid message skipped: %s", e)
+                    continue
+
+            # The requests to the TSA and to the API are blocking.
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(EXECUTOR, self.process, scan) for scan in scans),
+                return_exceptions=True,
+            )
+            # A failure must not stop the behaviour nor the processing of the batch.
+            for scan, result in zip(scans, results):
+                if isinstance(result, Exception):
+                    logger.error(
+                        "Error when processing scan %s", scan.meta.uuid, exc_info=result
                     )
-                try:
-                    r = requests.post(
-                        urllib.parse.urljoin(config.API_URL, "TimeStampTokens/"),
-                        data=dict_tst,
-                        headers=self.headers_octet_stream,
-                        auth=("admin", config.USERS["admin"]["password"]),
+
+        def process(self, scan: ScanDataCreate):
+            """Timestamps a scan and sends it, with its TimeStampToken, to the API."""
+            # TimeStampToken (TST, see RFC 3161).
+            # The base64 encoded payload is timestamped as is, without being
+            # decoded: this is the form stored in the database and checked by
+            # the /TimeStampTokens/check/ endpoint of the API.
+            digest = hashlib.sha256(scan.payload.raw.encode("utf-8")).digest()
+            tst = get_timestamper().timestamp(digest=digest)
+            dict_tst = {
+                "tst": base64.b64encode(tst).decode("utf-8"),
+                "scan_uuid": scan.meta.uuid,
+            }
+
+            try:
+                r = get_session().post(
+                    urllib.parse.urljoin(config.API_URL, "items/"),
+                    json=scan.model_dump(),
+                    headers=self.headers_json,
+                    auth=("admin", config.USERS["admin"]["password"]),
+                )
+                if r.status_code not in (200, 201):
+                    logger.error(
+                        "Error when sending POST request to the FastAPI server: %s",
+                        r.reason,
                     )
-                    if r.status_code not in (200, 201):
-                        print(
-                            f"Error when sending POST request to the FastAPI server: {r.reason}"
-                        )
-                except requests.exceptions.ConnectionError as e:
-                    print(
-                        f"Error when sending POST request to the FastAPI server:\n{e}"
+            except requests.exceptions.ConnectionError as e:
+                logger.error(
+                    "Error when sending POST request to the FastAPI server:\n%s", e
+                )
+            try:
+                r = get_session().post(
+                    urllib.parse.urljoin(config.API_URL, "TimeStampTokens/"),
+                    json=dict_tst,
+                    headers=self.headers_json,
+                    auth=("admin", config.USERS["admin"]["password"]),
+                )
+                if r.status_code not in (200, 201):
+                    logger.error(
+                        "Error when sending POST request to the FastAPI server: %s",
+                        r.reason,
                     )
-            else:
-                print("Did not received any message after 10 seconds")
+            except requests.exceptions.ConnectionError as e:
+                logger.error(
+                    "Error when sending POST request to the FastAPI server:\n%s", e
+                )
 
         def on_subscribed(self, jid):
-            print(
-                "[{}] Agent {} has accepted the subscription.".format(
-                    self.agent.name, jid.split("@")[0]
-                )
+            logger.info(
+                "[%s] Agent %s has accepted the subscription.",
+                self.agent.name,
+                jid.split("@")[0],
             )
-            print(
-                "[{}] Contacts List: {}".format(
-                    self.agent.name, self.agent.presence.get_contacts()
-                )
+            logger.info(
+                "[%s] Contacts List: %s",
+                self.agent.name,
+                self.agent.presence.get_contacts(),
             )
 
         def on_subscribe(self, jid):
-            print(
-                "[{}] Agent {} asked for subscription. Let's aprove it.".format(
-                    self.agent.name, jid.split("@")[0]
-                )
+            logger.info(
+                "[%s] Agent %s asked for subscription. Let's aprove it.",
+                self.agent.name,
+                jid.split("@")[0],
             )
             self.presence.approve(jid)
 
     async def setup(self):
-        print("Agent starting . . .")
+        logger.info("Agent starting . . .")
         collecting_behav = self.CollectingBehav()
         self.add_behaviour(collecting_behav)
 
@@ -126,27 +184,38 @@ async def main():
     agent = AggregationEngine(jid, passwd)
     await agent.start()
 
-    print("Contacts:")
+    logger.info("Contacts:")
     contacts = agent.presence.get_contacts()
     for contact in contacts:
-        print(f"  {contact}")
+        logger.info("  %s", contact)
 
     await agent.web.start(hostname="127.0.0.1", port="10000")
-    print("Web Graphical Interface available at:")
-    print("  http://127.0.0.1:10000/spade")
-    print("Wait until user interrupts with ctrl+C")
+    logger.info("Web Graphical Interface available at:")
+    logger.info("  http://127.0.0.1:10000/spade")
+    logger.info("Wait until user interrupts with ctrl+C")
 
     # wait until user interrupts with ctrl+C
-    while True:  # not agent.CollectingBehav.is_killed():
-        try:
-            await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            break
-
-    assert agent.CollectingBehav.exit_code == 10
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+    except NotImplementedError:
+        # Signal handlers are not supported by the event loops of Windows.
+        while True:
+            try:
+                await asyncio.sleep(1)
+            except KeyboardInterrupt:
+                break
+    else:
+        await stop.wait()
 
     await agent.stop()
 
 
 if __name__ == "__main__":
-    spade.run(main())
+    log_listener = setup_logging()
+    try:
+        spade.run(main())
+    finally:
+        log_listener.stop()
@@ -1,6 +1,13 @@
 import base64
+import logging
+import logging.handlers
+import queue
 import subprocess
 
+import requests
+import rfc3161ng
+from pyasn1.codec.der import encoder
+
 
 def exec_cmd(cmd: str = "fortune", working_dir: str = "") -> str:
     """Execute a command in a sub process and wait for the result."""
@@ -18,3 +25,63 @@ def exec_cmd(cmd: str = "fortune", working_dir: str = "") -> str:
     result = result.encode("utf-8")
     base64_result = base64.b64encode(result)
     return base64_result
+
+
+def setup_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Configures the root logger. Records are put in a queue and written by the
+    thread of the returned listener (already started), so that logging never
+    blocks on I/O."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+
+class SessionRemoteTimestamper(rfc3161ng.RemoteTimestamper):
+    """RemoteTimestamper sending the requests to the TSA through a requests
+    session, so that the connections are kept alive and reused.
+
+    rfc3161ng (2.1.3) calls requests.post directly in RemoteTimestamper.__call__.
+    Only the sending of the request is replaced here: the request is built and
+    the response checked with the functions of the library."""
+
+    def __init__(self, url: str, session: requests.Session, **kwargs):
+        super().__init__(url, **kwargs)
+        self.session = session
+
+    def timestamp(self, data=None, digest=None, nonce=None):
+        if data:
+            digest = rfc3161ng.api.data_to_digest(data, self.hashname)
+        request = rfc3161ng.make_timestamp_request(
+            digest=digest,
+            hashname=self.hashname,
+            include_tsa_certificate=self.include_tsa_certificate,
+            nonce=nonce,
+            tsa_policy_id=self.tsa_policy_id,
+        )
+        auth = None
+        if self.username is not None:
+            auth = (self.username, self.password)
+        try:
+            response = self.session.post(
+                self.url,
+                data=rfc3161ng.encode_timestamp_request(request),
+                timeout=self.timeout,
+                headers={"Content-Type": "application/timestamp-query"},
+                auth=auth,
+            )
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            raise rfc3161ng.TimestampingError(
+                f"Unable to send the request to {self.url!r}", exc
+            )
+        tsr = rfc3161ng.decode_timestamp_response(response.content)
+        self.check_response(tsr, digest, nonce=nonce)
+        return encoder.encode(tsr.time_stamp_token)
@@ -6,6 +6,8 @@ from contrib.openapi import openapi_to_yaml
 from typing import Optional
 from typing_extensions import Annotated
 from scandale import __version__
+from api import models
+from api.database import engine
 
 app = typer.Typer()
 
@@ -28,6 +30,12 @@ def openapi(format: str):
         print(openapi_to_yaml())
 
 
+@app.command()
+def init_db():
+    """Create the tables of the database."""
+    models.Base.metadata.create_all(bind=engine)
+
+
 # @app.callback()
 def main(
     version: Optional[bool] = typer.Option(